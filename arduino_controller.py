@@ -7,7 +7,7 @@
 # ## API
 # Parameters `port`, `baud`, and `timeout` ensure they are not being changed while the port is open, and raise a `RuntimeError` if it is.
 # 
-# **is_connected():** Returns if the port is open.
+# **connected:** Whether the port is open.
 # 
 # **connect():** Opens the port.
 # 
@@ -16,6 +16,14 @@
 # **run( name, \*args):** Runs the `name` command with passed arguments.
 #     `run[ name, \*args ]`
 #     
+# **wait_ready( timeout ):** Polls the arduino until it responds, e.g. after it resets on connection. Returns if it responded within `timeout` seconds.
+# 
+# **submit( name, \*args):** Sends the `name` command without waiting for its response, returning a `Future`. Responses are read in the background in the order commands were sent.
+#     
+# **run_batch( commands ):** Runs a list of `( name, args )` commands with a single write, returning a list of their results.
+# 
+# **run_raw( name, \*args):** Runs the `name` command, returning the unparsed response bytes.
+# 
 # **read_response():** Reads the port, and converts the JSON response to a Python object.
 
 # In[17]:
@@ -23,9 +31,19 @@
 
 import serial
 import json
-import logging
-
-
+import queue
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+
+try:
+    import orjson as _json # faster parsing, accepts bytes directly
+    
+except ImportError:
+    _json = json
+    
+    
 # In[49]:
 
 
@@ -48,18 +66,32 @@ class ArduinoController:
         :param port: The communication port.
         :param baud: The baud rate. [Default: 9600]
         :param timeout: The communication timeout in seconds. [Default: 2]
-        :param read_attempts: The number of times to attempts 
-            reading data before timing out. [Default: 3]
+        :param read_attempts: The number of timeout periods to wait 
+            for a response before timing out. [Default: 3]
         :param termination_char: Character to append to all written strings.
             [Default: None]
         """
         self.__port = port
         self.__baud = baud
         self.__timeout = timeout
-        self.__inst = serial.Serial()
+        
+        # port is set after creation, as passing it opens the port
+        self.__inst = serial.Serial( baudrate = baud, timeout = timeout )
+        self.__inst.port = port
+        
+        # background response reader
+        self.__pending = None # futures awaiting a response, in command order
+        self.__reader = None
+        self.__write_lock = threading.Lock()
+        self.__buffer = bytearray() # data read past the end of a response
+        self.__closing = False # stops the reader's reads on disconnect
         
         self.debug = False
         self.read_attempts = read_attempts
+        
+        # encoded command framing, reused for every command
+        self._prefix = b'run[ '
+        self._suffix = b''
         self.termination_char = termination_char
         
         
@@ -70,21 +102,47 @@ class ArduinoController:
         if self.__inst is not None and self.__inst.is_open:
             self.__inst.close()
             
+        if self.__pending is not None:
+            self.__pending.put( None ) # stop reader
+            
         self.__inst = None
         
         
     def __getattr__( self, name ):
         """
         Passes arbitrary run[] commands to the arduino.
+        Generated functions are cached, so repeated access is a dictionary lookup.
         
         :param name: The name of the command to run.
         :returns: A function that accepts arbitrary parameters 
             and runs self.run( name, *args ).
+        :raises AttributeError: If name is private or special.
         """
-        def call( *args ):
-            return self.run( name, *args )
+        if name.startswith( '_' ):
+            # not a command, e.g. accessed before initialization or by copy / pickle
+            raise AttributeError( name )
+        
+        cache = self.__dict__.setdefault( '_cmd_cache', {} )
+        call = cache.get( name )
+        if call is None:
+            # weak reference prevents a cycle that would delay __del__
+            ref = weakref.ref( self )
+            
+            def call( *args ):
+                return ref().run( name, *args )
+            
+            cache[ name ] = call
             
         return call
+    
+    
+    def __getstate__( self ):
+        """
+        Excludes cached command functions from copies.
+        """
+        state = self.__dict__.copy()
+        state.pop( '_cmd_cache', None )
+        return state
         
         
     @property
@@ -96,7 +154,7 @@ class ArduinoController:
         """
         :raises RuntimeError: If the port is open.
         """
-        if self.is_connected():
+        if self.connected:
             raise RuntimeError( "Can not change port while connected" )
             
         self.__port = port
@@ -112,7 +170,7 @@ class ArduinoController:
         """
         :raises RuntimeError: If the port is open.
         """
-        if self.is_connected():
+        if self.connected:
             raise RuntimeError( "Can not change baud while connected" )
             
         self.__baud = baud
@@ -121,18 +179,36 @@ class ArduinoController:
         
     @property
     def timeout( self ):
-        return self.__baud
+        return self.__timeout
     
     @timeout.setter
     def timeout( self, timeout ):
         """
         :raises RuntimeError: If the port is open. 
         """
-        if self.is_connected():
+        if self.connected:
             raise RuntimeError( "Can not change timeout while connected" )
             
         self.__timeout = timeout
-        self.__inst.timeout( timeout )
+        self.__inst.timeout = timeout
+        
+    @property
+    def termination_char( self ):
+        return self.__termination_char
+    
+    @termination_char.setter
+    def termination_char( self, char ):
+        self.__termination_char = char
+        self._suffix = ( char or '' ).encode( 'utf-8' )
+        
+        
+    @property
+    def serial( self ):
+        """
+        :returns: The underlying serial.Serial port, e.g. for driver settings.
+        """
+        return self.__inst
+        
         
     @property    
     def connected( self ):
@@ -151,14 +227,203 @@ class ArduinoController:
         if self.__inst.is_open:
             raise RuntimeError( 'Already connected' )
             
-        self.__inst.baudrate = self.__baud
-        self.__inst.port = self.__port
-        self.__inst.timeout = self.__timeout
+        # parameters are kept up to date by their setters
         self.__inst.open()
+        self.__buffer.clear()
+        self.__closing = False
+        
+        # reader only holds a weak reference so __del__ can still close the port
+        self.__pending = queue.Queue()
+        self.__reader = threading.Thread( 
+            target = ArduinoController._read_loop, 
+            args = ( weakref.ref( self ), self.__pending ),
+            daemon = True
+        )
+        self.__reader.start()
         
         
     def disconnect( self ):
-        self.__inst.close()
+        self.__closing = True
+        try:
+            if hasattr( self.__inst, 'cancel_read' ):
+                # close() does not wake a read blocked in the reader thread
+                self.__inst.cancel_read()
+                
+            self.__inst.close()
+            
+        finally:
+            if self.__reader is not None:
+                # cancelled reads fail outstanding responses, then the reader stops
+                self.__pending.put( None )
+                self.__reader.join()
+                
+                self.__pending = None
+                self.__reader = None
+    
+    
+    def wait_ready( self, timeout = 3 ):
+        """
+        Polls the arduino with echo commands until it responds,
+            backing off exponentially between attempts.
+        Only one probe is outstanding at a time, 
+            so late probe replies can not be mistaken for command responses.
+        Must be called before any commands are submitted.
+        
+        :param timeout: The maximum time to wait in seconds. [Default: 3]
+        :returns: True if the arduino responded, otherwise False.
+        """
+        payload = bytearray()
+        self._encode( payload, 'echo', ( 'rdy', ) )
+        deadline = time.monotonic() + timeout
+        
+        # at least one echo round trip, with margin for adapter latency
+        round_trip = 0.1 + 10* ( len( payload ) + 64 )/ self.__baud
+        delay = round_trip
+        
+        with self.__write_lock:
+            while time.monotonic() < deadline:
+                self.__inst.write( payload )
+                if self.__wait_reply( min( time.monotonic() + delay, deadline ), deadline ):
+                    # ready, discard probe replies until the line is quiet
+                    while self.__wait_data( time.monotonic() + round_trip ):
+                        self.__inst.read( self.__inst.in_waiting )
+                        
+                    self.__inst.reset_input_buffer()
+                    self.__buffer.clear()
+                    return True
+                
+                delay = min( 2* delay, 0.5 )
+                
+        return False
+    
+    
+    def __wait_data( self, until ):
+        """
+        Waits for data to be available to read.
+        
+        :param until: Monotonic time to wait until.
+        :returns: True if data is available, otherwise False.
+        """
+        while not self.__inst.in_waiting:
+            if time.monotonic() >= until:
+                return False
+            
+            time.sleep( 0.01 )
+            
+        return True
+    
+    
+    def __wait_reply( self, until, deadline ):
+        """
+        Reads until a complete reply is received.
+        A reply that has started arriving is waited for until the deadline.
+        
+        :param until: Monotonic time to wait until if no reply has started.
+        :param deadline: Monotonic time to wait until for a started reply.
+        :returns: True if a complete reply was received, otherwise False.
+        """
+        buffer = self.__buffer
+        buffer.clear()
+        while b'}' not in buffer:
+            if not self.__wait_data( deadline if buffer else until ):
+                return False
+            
+            buffer.extend( self.__inst.read( self.__inst.in_waiting ) )
+            
+        return True
+    
+    
+    @staticmethod
+    def _read_loop( ref, pending ):
+        """
+        Resolves pending futures with responses, in order.
+        Responses echo their command, so stray or late responses 
+            to other commands are discarded instead of misrouted.
+        Runs in the reader thread until a None is queued.
+        
+        :param ref: Weak reference to the controller.
+        :param pending: Queue of ( future, parse, marker ) tuples awaiting a response,
+            where parse converts the raw response to the future's result,
+            and marker is the command field the response must contain.
+        """
+        while True:
+            item = pending.get()
+            controller = ref()
+            if ( item is None ) or ( controller is None ):
+                return
+            
+            future, parse, marker = item
+            try:
+                raw = controller.read_response_raw()
+                while marker not in raw:
+                    # response to another command, e.g. after a timeout
+                    raw = controller.read_response_raw()
+                    
+                future.set_result( parse( raw ) )
+                
+            except Exception as err:
+                future.set_exception( err )
+            
+            # release references while waiting, including any traceback
+            del item, future, parse, marker, controller
+            
+            
+    def submit( self, name, *args ):
+        """
+        Sends a command without waiting for its response.
+        
+        :param name: The command to run.
+        :returns: A Future resolving to the value run() would return.
+        :raises RuntimeError: If not connected.
+        """
+        return self._submit( name, args, self._parse_raw )
+    
+    
+    def _submit( self, name, args, parse ):
+        """
+        Sends a command, queueing its future for the reader.
+        
+        :param name: The command to run.
+        :param args: Tuple of command arguments.
+        :param parse: Function converting the raw response to the result.
+        :returns: A Future resolving to the parsed response.
+        :raises RuntimeError: If not connected.
+        """
+        if self.__pending is None:
+            raise RuntimeError( 'Not connected' )
+        
+        future = Future()
+        payload = bytearray()
+        marker = self._encode( payload, name, args )
+        with self.__write_lock:
+            # queue in write order so responses match their commands
+            self.__inst.write( payload )
+            self.__pending.put( ( future, parse, marker ) )
+            
+        return future
+    
+    
+    def _encode( self, buffer, name, args ):
+        """
+        Appends an encoded command, including termination character, to a buffer.
+        
+        :param buffer: The bytearray to append to.
+        :param name: The command name.
+        :param args: Tuple of command arguments.
+        :returns: The command field of the expected response, as bytes.
+        """
+        start = len( buffer )
+        buffer += self._prefix
+        buffer += name.encode( 'ascii' )
+        for arg in args:
+            buffer += b', '
+            buffer += str( arg ).encode( 'ascii' )
+            
+        buffer += b' ]'
+        command = buffer[ start: ].decode( 'ascii' ).strip() # trimmed by the arduino
+        buffer += self._suffix
+        
+        return b'"command":' + json.dumps( command ).encode( 'ascii' )
     
     
     def run( self, name, *args ):
@@ -171,33 +436,107 @@ class ArduinoController:
             returns a dictionary. None if neither are available.
         :raises RuntimeError: If the command has an error status.
         """
-        cmd = 'run[ {}'.format( name )
-        for arg in args:
-            cmd += ', {}'.format( arg )
-        cmd += ' ]'
+        return self.submit( name, *args ).result()
+    
+    
+    def run_batch( self, commands ):
+        """
+        Runs several commands, sending them in a single write.
+        Arduino receive buffers are small (64 bytes), so keep batches short.
+        
+        :param commands: List of ( name, args ) tuples, 
+            where args is a tuple of command arguments.
+        :returns: List of the values run() would return for each command.
+        :raises RuntimeError: If not connected, or if a command has an error status.
+        """
+        if self.__pending is None:
+            raise RuntimeError( 'Not connected' )
+        
+        futures = [ Future() for _ in commands ]
+        payload = bytearray()
+        markers = [ self._encode( payload, name, args ) for name, args in commands ]
+        with self.__write_lock:
+            self.__inst.write( payload )
+            for future, marker in zip( futures, markers ):
+                self.__pending.put( ( future, self._parse_raw, marker ) )
+        
+        # responses are ordered, so wait for each in turn
+        return [ future.result() for future in futures ]
+    
+    
+    def run_raw( self, name, *args ):
+        """
+        Runs a command and returns the unparsed response.
+        Useful for cheap checks on short, fixed responses.
+        
+        :param name: The command to run
+        :returns: The raw JSON response as bytes. The status is not checked.
+        """
+        return self._submit( name, args, bytes ).result()
+    
+    
+    def _run_noreturn( self, name, *args ):
+        """
+        Runs a command whose response value is not needed.
+        Only the status is checked, so the response is not parsed on success.
+        
+        :param name: The command to run
+        :raises RuntimeError: If the command has an error status.
+        """
+        self._submit( name, args, self._check_status ).result()
         
-        if self.termination_char is not None:
-            cmd += self.termination_char
+        
+    def _check_status( self, raw ):
+        """
+        Checks a raw response for an error status.
+        
+        :param raw: The raw response from read_response_raw().
+        :returns: None
+        :raises RuntimeError: If the command has an error status.
+        """
+        if b'"status":"error"' in raw:
+            # parse for error message
+            self._parse_raw( raw )
             
-        self.__inst.write( bytes( cmd, 'utf-8' ) )
-        resp = self.read_response()
+        return None
+    
+    
+    def _parse_raw( self, raw ):
+        """
+        Loads a raw response and converts it into the value returned by run().
         
+        :param raw: The raw response from read_response_raw().
+        :returns: See run().
+        :raises RuntimeError: If the command has an error status.
+        """
+        return self._parse_response( _json.loads( raw ) )
+        
+    
+    def _parse_response( self, resp ):
+        """
+        Converts a response into the value returned by run().
+        
+        :param resp: The response object from read_response().
+        :returns: See run().
+        :raises RuntimeError: If the command has an error status.
+        """
         if resp[ 'status' ] == 'error':
             # command failed
             raise RuntimeError( 'Command failed: {}'.format( resp[ 'command'] ) )
     
-        keys = resp.keys()
-        if ( 'response' in keys ) and ( 'id' in keys ):
+        response = resp.get( 'response' )
+        resp_id = resp.get( 'id' )
+        if ( response is not None ) and ( resp_id is not None ):
             return {
-                'response': resp[ 'response' ],
-                'id': resp[ 'id' ]
+                'response': response,
+                'id': resp_id
             }
         
-        elif 'response' in keys:
-            return resp[ 'response' ]
+        elif response is not None:
+            return response
         
-        elif 'id' in keys:
-            return resp[ 'id' ]
+        elif resp_id is not None:
+            return resp_id
         
         else:
             return None
@@ -206,32 +545,50 @@ class ArduinoController:
     def read_response( self ):
         """
         Reads the JSON response from the arduino.
+        Used by the reader thread, so should not be called while commands are pending.
         
         :returns: The JSON object loaded into a Python object.
         :raises RuntimeError: If the data read times out
         """
-        resp = b''
-        curr = None
-        resp_len = len ( resp )
-        attempts = 0
+        return _json.loads( self.read_response_raw() )
+    
+    
+    def read_response_raw( self ):
+        """
+        Reads the JSON response from the arduino without parsing it.
+        Used by the reader thread, so should not be called while commands are pending.
         
-        while curr != b'}' and attempts < self.read_attempts:
-            # read until end of json
-            curr = self.__inst.read()
-            resp += curr
-            
-            # check if data read in
-            if len( resp ) == resp_len:
-                # no data read in
-                attempts += 1
-                
-            resp_len = len ( resp )
+        :returns: The raw JSON response as a bytearray.
+        :raises RuntimeError: If the data read times out
+        """
+        buffer = self.__buffer
+        deadline = (
+            None if ( self.__timeout is None ) 
+            else time.monotonic() + self.__timeout* self.read_attempts
+        )
+        
+        scanned = 0 # only search newly read data for the end of the response
+        while True:
+            end = buffer.find( b'}', scanned )
+            if end > -1:
+                # end of json, keep remaining data for next response
+                resp = buffer[ : end + 1 ]
+                del buffer[ : end + 1 ]
+                return resp
             
-        if attempts == self.read_attempts:
-            # data read timed out
-            raise RuntimeError( 'Data read timed out with response: {}'.format( resp ) )
+            if ( deadline is not None ) and ( time.monotonic() > deadline ):
+                # data read timed out, discard partial response
+                resp = bytes( buffer )
+                buffer.clear()
+                raise RuntimeError( 'Data read timed out with response: {}'.format( resp ) )
             
-        return json.loads( resp )
+            # read all available data, or wait for more
+            scanned = len( buffer )
+            buffer.extend( self.__inst.read( self.__inst.in_waiting or 1 ) )
+            if self.__closing:
+                # read was cancelled by disconnect
+                buffer.clear()
+                raise RuntimeError( 'Disconnected while reading response' )
 
 
 # # Work
@@ -8,13 +8,21 @@
 # 
 # Utilizes an Arduino Controller for communication. Commands that differ form the standard arduino commands are listed here.
 # 
-# **connect():** Connects with the controller and attempts to read the steps per revolution. If the steps per revolution is not read, the default value is used.
+# **connect():** Connects with the controller, waiting up to 3 seconds for it to respond, and attempts to read the steps per revolution. If the steps per revolution is not read, the default value is used.
+# 
+# **with SampleHolderController( port ) as sh:** Connects on entry. On exit disables the motor and disconnects, even if the device is gone.
 # 
 # **is_enabled():** Returns a boolean of whether the program is connected to the controller.
 # 
 # **step( num ):** Moves the number of sample steps provided. The motor steps to move per sample step is calculated from the steps per revolution and the number of samples spaces the holder has.
 # 
-# **goto( num ):** Moves to the specified sample.
+# **sample_steps( num ):** Returns the shortest number of samples to move from the current position to reach the specified sample.
+# 
+# **goto( num ):** Moves to the specified sample, with a single move command.
+# 
+# **submit_goto( num ), submit_move( steps ), submit_offset( num ):** Start the corresponding motion without waiting for it to finish.
+# 
+# **poll_status():** Applies finished motions to the position without blocking. Returns whether the motor is idle.
 
 # In[1]:
 
@@ -26,9 +34,10 @@
 # In[1]:
 
 
-import time
 import math
-import json
+from collections import deque
+from concurrent.futures import Future
+from contextlib import contextmanager
 import arduino_controller as arduino
 
 # from importlib import reload
@@ -58,6 +67,9 @@ class SampleHolderController( arduino.ArduinoController ):
         :param baud: The baud rate for communication. [Default 9600]
         :param timeout: Communication timeout in seconds. [Default: 10]
         """
+        self.__spr = None
+        self.__samples = None
+        
         arduino.ArduinoController.__init__( 
             self, 
             port = port, 
@@ -67,11 +79,54 @@ class SampleHolderController( arduino.ArduinoController ):
         )
         self.samples = samples
         self.position = None # current motor position
+        self._enabled = None # last known motor state, None if unknown
+        self._in_flight = deque() # ( future, steps ) of submitted motions
         
         self.SPR = None
         self.DEFAULT_SPR = spr # steps per revolution       
             
 
+    @property
+    def SPR( self ):
+        return self.__spr
+    
+    @SPR.setter
+    def SPR( self, spr ):
+        self.__spr = spr
+        self.__update_sample_width()
+        
+        
+    @property
+    def samples( self ):
+        return self.__samples
+    
+    @samples.setter
+    def samples( self, samples ):
+        self.__samples = samples
+        self.__update_sample_width()
+        
+        
+    def __update_sample_width( self ):
+        """
+        Caches the steps per sample space and its half width.
+        Integers are used if the width and half width are whole steps.
+        """
+        if self.__spr is None or self.__samples is None:
+            self._steps_per_sample = None
+            self._half_width = None
+            self._integral_width = False
+            return
+        
+        self._integral_width = ( self.__spr% ( 2* self.__samples ) == 0 )
+        if self._integral_width:
+            self._steps_per_sample = self.__spr// self.__samples
+            self._half_width = self._steps_per_sample// 2
+            
+        else:
+            self._steps_per_sample = self.__spr/ self.__samples
+            self._half_width = self._steps_per_sample/ 2
+        
+
     @property 
     def sample( self ):
         """
@@ -80,9 +135,10 @@ class SampleHolderController( arduino.ArduinoController ):
         if self.position is None:
             return None
         
-        s_width = self.SPR/ self.samples
-        offset = s_width/ 2
-        sample = ( self.position + offset )/ s_width
+        if self._integral_width:
+            return ( self.position + self._half_width )// self._steps_per_sample
+        
+        sample = ( self.position + self._half_width )/ self._steps_per_sample
         return math.floor( sample  )
         
         
@@ -95,7 +151,7 @@ class SampleHolderController( arduino.ArduinoController ):
         :raises: RuntimeError if steps per revolution could not be obtained
         """
         super().connect()
-        time.sleep( 3 ) # delay to establish connection, in seconds
+        self.wait_ready( 3 ) # arduino resets when the port is opened
         
         try:
             self.SPR = self.get_spr()
@@ -108,24 +164,111 @@ class SampleHolderController( arduino.ArduinoController ):
             ) 
    
     
+    def disconnect( self ):
+        super().disconnect()
+        self._enabled = None
+        self._in_flight.clear()
+        
+        
+    def __enter__( self ):
+        """
+        Connects, closing the port again if connecting fails.
+        """
+        try:
+            self.connect()
+            
+        except:
+            if self.connected:
+                self.disconnect()
+                
+            raise
+            
+        return self
+    
+    
+    def __exit__( self, exc_type, exc_value, traceback ):
+        """
+        Disables the motor and disconnects.
+        Errors are ignored, so the port is released even if the device is gone.
+        """
+        try:
+            self.disable()
+            
+        except Exception:
+            pass
+        
+        try:
+            self.disconnect()
+            
+        except Exception:
+            pass
+        
+        
+    @contextmanager
+    def __invalidate_on_error( self ):
+        """
+        Invalidates the known motor state if a command fails.
+        """
+        try:
+            yield
+            
+        except RuntimeError:
+            self._enabled = None
+            raise
+            
+            
+    def run( self, name, *args ):
+        with self.__invalidate_on_error():
+            return super().run( name, *args )
+            
+            
+    def run_batch( self, commands ):
+        with self.__invalidate_on_error():
+            return super().run_batch( commands )
+            
+            
+    def _run_noreturn( self, name, *args ):
+        with self.__invalidate_on_error():
+            super()._run_noreturn( name, *args )
+            
+   
     def enable( self ):
-        self.run( 'enable' )
-        self.position = self.run( 'get_pos' )
+        _, self.position = self.run_batch( [ ( 'enable', () ), ( 'get_pos', () ) ] )
+        self._enabled = True
+        
+        
+    def disable( self ):
+        self._run_noreturn( 'disable' )
+        self._enabled = False
         
         
     def home( self ):
-        self.run( 'home' )
+        self._run_noreturn( 'home' )
         self.position = 0
 
         
-    def is_enabled( self ):
+    def is_enabled( self, force = False ):
         """
         Returns whether the motor is enabled or not.
+        The controller is only queried if the state is unknown,
+            as it only changes through enable() and disable().
         
+        :param force: Query the controller even if the state is known. [Default: False]
         :returns: True or False
         """
-        resp = self.run( 'is_enabled' )
-        return True if ( resp == '1' ) else False
+        if force or ( self._enabled is None ):
+            # response is fixed, avoid parsing unless unexpected
+            raw = self.run_raw( 'is_enabled' )
+            if b'"response":"1"' in raw:
+                self._enabled = True
+                
+            elif b'"response":"0"' in raw:
+                self._enabled = False
+                
+            else:
+                self._enabled = ( self._parse_raw( raw ) == '1' )
+            
+        return self._enabled
         
         
     def move( self, steps ):
@@ -138,7 +281,7 @@ class SampleHolderController( arduino.ArduinoController ):
         if not self.is_enabled():
             raise RuntimeError( 'Motor is not enabled.' )
             
-        self.run( 'move', steps )
+        self._run_noreturn( 'move', steps )
         
         # update motor position
         self.position = ( self.position + steps )% self.SPR
@@ -150,15 +293,19 @@ class SampleHolderController( arduino.ArduinoController ):
         
         :param num: The number of samples to move. [Default: 1]
         """
-        steps = num*( self.SPR/ self.samples )
+        steps = num* self._steps_per_sample
         self.move( steps )
         
     
-    def goto( self, num = 0 ):
+    def sample_steps( self, num ):
         """
-        Goes to a specific sample.
+        Calculates the shortest relative sample move 
+            from the current position to a specific sample.
+        The result depends on the current sample, 
+            so it is only valid until the next move.
         
-        :param num: The sample number to go to. [Default: 0]
+        :param num: The sample number to move to.
+        :returns: The number of samples to move, negative for reverse.
         :raises: ValueError if an invalid sample number is given.
         """
         if ( num < 0 ) or ( num > self.samples ):
@@ -171,7 +318,17 @@ class SampleHolderController( arduino.ArduinoController ):
             # move in opposite direction
             steps -= self.samples
             
-        self.step( steps )
+        return steps
+    
+    
+    def goto( self, num = 0 ):
+        """
+        Goes to a specific sample using a single move command.
+        
+        :param num: The sample number to go to. [Default: 0]
+        :raises: ValueError if an invalid sample number is given.
+        """
+        self.step( self.sample_steps( num ) )
     
         
     def offset( self, num ):
@@ -182,10 +339,116 @@ class SampleHolderController( arduino.ArduinoController ):
         """
         pos = self.position
         self.move( num )
-        super().run( 'offset', -num ) # compensate for movement
+        
+        # compensate for movement, only once the move succeeded
+        self._run_noreturn( 'offset', -num )
         
         # reset position
         self.position = pos
+        
+        
+    def submit_move( self, steps ):
+        """
+        Starts a relative motor move without waiting for it to finish.
+        The position is updated by poll_status() once the move completes.
+        
+        :param steps: The number of steps to take.
+        :returns: A Future resolving when the move finishes.
+        :raises: RuntimeError if the motor is not enabled.
+        """
+        if not self.is_enabled():
+            raise RuntimeError( 'Motor is not enabled.' )
+            
+        future = self._submit( 'move', ( steps, ), self._check_status )
+        self._in_flight.append( ( future, steps ) )
+        return future
+    
+    
+    def submit_goto( self, num = 0 ):
+        """
+        Starts going to a specific sample without waiting for it to finish.
+        
+        :param num: The sample number to go to. [Default: 0]
+        :returns: A Future resolving when the move finishes.
+        :raises: ValueError if an invalid sample number is given.
+        :raises: RuntimeError if the motor is still moving,
+            as the current sample is not yet known.
+        """
+        if not self.poll_status():
+            raise RuntimeError( 'Motor is moving.' )
+        
+        steps = self.sample_steps( num )* self._steps_per_sample
+        return self.submit_move( steps )
+    
+    
+    def submit_offset( self, num ):
+        """
+        Starts shifting the relative position without waiting for it to finish.
+        As with offset(), the offset is only sent once the move succeeded.
+        
+        :param num: The amount of steps to offset.
+        :returns: A Future resolving when the offset finishes,
+            cancelled if the move failed.
+        :raises: RuntimeError if the motor is not enabled.
+        """
+        if not self.is_enabled():
+            raise RuntimeError( 'Motor is not enabled.' )
+        
+        future = Future()
+        
+        def finish( offset ):
+            err = offset.exception()
+            if err is not None:
+                future.set_exception( err )
+                
+            else:
+                future.set_result( None )
+        
+        def send_offset( move ):
+            # runs in the reader thread once the move finishes
+            if move.exception() is not None:
+                # move failed, reported by poll_status()
+                future.cancel()
+                return
+            
+            try:
+                offset = self._submit( 'offset', ( -num, ), self._check_status )
+                
+            except Exception as err:
+                future.set_exception( err )
+                return
+            
+            offset.add_done_callback( finish )
+        
+        # the offset compensates the move, so the position is only changed 
+        # if the move succeeds but the offset fails
+        move = self._submit( 'move', ( num, ), self._check_status )
+        self._in_flight.append( ( move, num ) )
+        self._in_flight.append( ( future, -num ) )
+        move.add_done_callback( send_offset )
+        return future
+    
+    
+    def poll_status( self ):
+        """
+        Applies finished motions to the position without blocking.
+        
+        :returns: True if no motions are in flight, False otherwise.
+        :raises: RuntimeError if a finished motion failed.
+        """
+        in_flight = self._in_flight
+        while in_flight and in_flight[ 0 ][ 0 ].done():
+            future, steps = in_flight.popleft()
+            if future.cancelled():
+                # never sent, see submit_offset()
+                continue
+            
+            with self.__invalidate_on_error():
+                future.result()
+            
+            self.position = ( self.position + steps )% self.SPR
+            
+        return not in_flight
 
 
 # # Work
@@ -22,7 +22,11 @@ import os
 import sys
 import re
 import math
-import serial
+import bisect
+import time
+import queue
+import warnings
+from serial.tools import list_ports
 
 # PyQt
 from PyQt5 import QtGui
@@ -30,8 +34,12 @@ from PyQt5 import QtGui
 from PyQt5.QtCore import (
     Qt,
     QCoreApplication,
+    QMetaObject,
+    QObject,
     QTimer,
-    QThread
+    QThread,
+    pyqtSignal,
+    pyqtSlot
 )
 
 from PyQt5.QtWidgets import (
@@ -39,6 +47,7 @@ from PyQt5.QtWidgets import (
     QWidget,
     QVBoxLayout,
     QHBoxLayout,
+    QGridLayout,
     QFormLayout,
     QLabel,
     QPushButton,
@@ -53,18 +62,310 @@ from PyQt5.QtWidgets import (
 )
 
 # controller
-import import_ipynb # FREEZE
+try:
+    # only needed when the controller is a notebook
+    import import_ipynb # FREEZE
+    
+except ImportError:
+    pass
+
 import sample_holder_controller as shc
 
+_COM_PORT_RE = re.compile( r"(\w+)\s*(\(\s*\w*\s*\))?" )
+_NO_PORTS_SENTINEL = 'No COM ports available...'
+
+_BOLD_FONT = None
+
+def _bold_font():
+    """
+    :returns: A shared bold font, created on first use 
+        as the application must exist.
+    """
+    global _BOLD_FONT
+    if _BOLD_FONT is None:
+        _BOLD_FONT = QtGui.QFont()
+        _BOLD_FONT.setBold( True )
+        
+    return _BOLD_FONT
+
+
+def _resolve_images_dir():
+    """
+    Finds the images folder, checking the frozen bundle,
+        then this module's folder, then the working directory.
+    
+    :returns: Path of the images folder.
+    """
+    candidates = []
+    if hasattr( sys, '_MEIPASS' ):
+        # frozen bundle
+        candidates.append( sys._MEIPASS )
+    
+    if '__file__' in globals():
+        # not defined in notebooks
+        candidates.append( os.path.dirname( os.path.abspath( __file__ ) ) )
+        
+    candidates.append( os.getcwd() )
+    for base in candidates:
+        images = os.path.join( base, 'images' )
+        if os.path.isdir( images ):
+            return images
+        
+    # let loading report the missing images
+    return os.path.join( os.getcwd(), 'images' )
+
 
 # In[14]:
 
 
+class ControllerWorker( QObject ):
+    """
+    Runs sample holder commands on a worker thread, 
+        so serial communication does not block the interface.
+    Commands are ( name, *args ) tuples passed to execute(),
+        which calls the matching cmd_<name> method.
+    Motions are ( name, *args ) tuples put on the motion queue,
+        which are started in turn with the controller's submit_<name> method
+        and polled until they finish, without blocking the worker.
+    """
+    
+    connected      = pyqtSignal( bool )
+    enabled        = pyqtSignal( bool )
+    sample_changed = pyqtSignal( object ) # sample number, or None
+    error          = pyqtSignal( str )
+    done           = pyqtSignal() # command finished
+    
+    
+    def __init__( self, cmd_queue ):
+        """
+        :param cmd_queue: queue.Queue of motions.
+        """
+        super().__init__()
+        self.inst = None # the instrument
+        
+        self._cmd_queue = cmd_queue
+        self._moving = False # a motion is in flight
+        
+        # moved to the worker thread with the worker
+        self._poll_timer = QTimer( self )
+        self._poll_timer.setInterval( 20 )
+        self._poll_timer.timeout.connect( self.poll )
+        
+    
+    @pyqtSlot( object )
+    def execute( self, cmd ):
+        name, *args = cmd
+        try:
+            getattr( self, 'cmd_' + name )( *args )
+            
+        except Exception as err:
+            self.error.emit( str( err ) )
+            
+        finally:
+            self.done.emit()
+            
+            
+    def cmd_connect( self, port ):
+        inst = shc.SampleHolderController( port )
+        try:
+            inst.connect()
+            self.set_low_latency( inst.serial )
+            enabled = inst.is_enabled()
+            
+        except Exception as err:
+            if inst.connected:
+                inst.disconnect()
+                
+            self.connected.emit( False )
+            self.error.emit( 'Could not connect\n{}'.format( err ) )
+            return
+        
+        self.inst = inst
+        self._poll_timer.start()
+        self.connected.emit( True )
+        self.enabled.emit( enabled )
+        self.sample_changed.emit( inst.sample )
+        
+        
+    def set_low_latency( self, port ):
+        """
+        Reduces driver latency of the serial port where supported.
+        
+        :param port: The serial.Serial port.
+        """
+        try:
+            # ASYNC_LOW_LATENCY, e.g. FTDI latency timer, on Linux
+            port.set_low_latency_mode( True )
+            
+        except ( AttributeError, OSError, NotImplementedError, ValueError ):
+            pass
+        
+        if sys.platform.startswith( 'win' ):
+            try:
+                port.set_buffer_size( rx_size = 4096, tx_size = 4096 )
+                
+            except ( AttributeError, OSError ):
+                pass
+            
+            
+    @pyqtSlot()
+    def stop_polling( self ):
+        """
+        Stops polling motions. 
+        Must run in the worker thread, which owns the timer.
+        """
+        self._poll_timer.stop()
+        
+        
+    def cmd_disconnect( self ):
+        self.stop_polling()
+        self.cancel_motions()
+        
+        inst, self.inst = self.inst, None
+        if inst is not None:
+            # release the port even if the device is gone
+            try:
+                inst.disable()
+                
+            except Exception:
+                pass
+            
+            try:
+                inst.disconnect()
+                
+            except Exception:
+                pass
+            
+        self.connected.emit( False )
+        self.enabled.emit( False )
+        
+        
+    def cmd_toggle_enable( self ):
+        if self.inst.is_enabled():
+            self.inst.disable()
+            enabled = False
+            
+        else:
+            self.inst.enable()
+            self.inst.home()
+            self.sample_changed.emit( self.inst.sample )
+            enabled = True
+            
+        # new state is known, no need to query it
+        self.enabled.emit( enabled )
+        
+        
+    @pyqtSlot()
+    def poll( self ):
+        """
+        Finishes the motion in flight, if complete, 
+            then starts the next queued motion.
+        """
+        if self._moving:
+            try:
+                if not self.inst.poll_status():
+                    # still moving
+                    return
+                
+                self.sample_changed.emit( self.inst.sample )
+            
+            except Exception as err:
+                self.error.emit( str( err ) )
+                
+            self._moving = False
+            self.done.emit()
+            
+        try:
+            name, *args = self._cmd_queue.get_nowait()
+            
+        except queue.Empty:
+            return
+        
+        try:
+            getattr( self.inst, 'submit_' + name )( *args )
+            self._moving = True
+            
+        except Exception as err:
+            self.error.emit( str( err ) )
+            self.done.emit()
+            
+            
+    def cancel_motions( self ):
+        """
+        Drops the motion in flight and any queued motions.
+        """
+        if self._moving:
+            self._moving = False
+            self.done.emit()
+            
+        while True:
+            try:
+                self._cmd_queue.get_nowait()
+                
+            except queue.Empty:
+                return
+            
+            self.done.emit()
+        
+        
+
 class SampleHolderInterface( QWidget ):
     
+    cmd = pyqtSignal( object ) # command for the worker
+    
+    # status lights, shared by all instances
+    _icons_loaded   = False
+    img_redLight    = None
+    img_greenLight  = None
+    img_yellowLight = None
+    
+    @classmethod
+    def _load_icons( cls, image_folder ):
+        """
+        Loads and scales the status light images once.
+        
+        :param image_folder: Folder containing the images.
+        """
+        if cls._icons_loaded:
+            return
+        
+        cls.img_redLight = cls._load_icon( image_folder, 'red-light.png' )
+        cls.img_greenLight = cls._load_icon( image_folder, 'green-light.png' )
+        cls.img_yellowLight = cls._load_icon( image_folder, 'yellow-light.png' )
+        cls._icons_loaded = True
+        
+        
+    @staticmethod
+    def _load_icon( image_folder, name ):
+        """
+        Loads and scales a status light image, 
+            warning if it could not be loaded.
+        
+        :param image_folder: Folder containing the images.
+        :param name: File name of the image.
+        :returns: The scaled QPixmap.
+        """
+        path = os.path.join( image_folder, name )
+        pixmap = QtGui.QPixmap( path )
+        if pixmap.isNull():
+            warnings.warn( 'Could not load image {}'.format( path ) )
+            return pixmap
+            
+        return pixmap.scaledToHeight( 32 )
+        
+    
     #--- window close ---
     def closeEvent( self, event ):
-        self.delete_controller()
+        if self.worker_thread.isRunning():
+            # teardown has not run yet, worker thread owns the poll timer
+            QMetaObject.invokeMethod( self.worker, 'stop_polling', Qt.BlockingQueuedConnection )
+            self.worker_thread.quit()
+            self.worker_thread.wait()
+            
+            # worker thread stopped, safe to disconnect directly
+            self.inst = None
+            self.worker.cmd_disconnect()
+            
         event.accept()
         
     
@@ -79,21 +380,40 @@ class SampleHolderInterface( QWidget ):
         super().__init__()
         
         #--- instance variables ---
-#         image_folder = resources + '/images/' # FREEZE
-        image_folder = os.getcwd() + '/images/' 
-    
-        self.img_redLight = QtGui.QPixmap(    image_folder + 'red-light.png'    ).scaledToHeight( 32 )        
-        self.img_greenLight = QtGui.QPixmap(  image_folder + 'green-light.png'  ).scaledToHeight( 32 )
-        self.img_yellowLight = QtGui.QPixmap( image_folder + 'yellow-light.png' ).scaledToHeight( 32 )
+#         image_folder = os.path.join( resources, 'images' ) # FREEZE
+        image_folder = _resolve_images_dir()
+        self._load_icons( image_folder )
         
+        self._ports_cache = None # ( timestamp, ports )
         self.ports  = self.getComPorts()
         self.port   = None
-        self.inst   = None # the instrument
+        self.inst   = None # the instrument, owned by the worker
+        self._enabled_cache = None # last enabled state reported by the worker
         
         self.samples = samples
         self.occupied = []
+        self._occupied_sorted = [] # occupied samples, sorted for searching
+        
+        #--- worker ---
+        self.pending_cmds = 0 # commands sent to the worker, but not finished
+        self._cmd_queue = queue.Queue() # motions for the worker
+        self.worker = ControllerWorker( self._cmd_queue )
+        self.worker_thread = QThread()
+        self.worker.moveToThread( self.worker_thread )
+        self.worker_thread.start()
         
         #--- timers ---
+        # coalesce rapid port selection changes
+        self._port_change_timer = QTimer( self )
+        self._port_change_timer.setSingleShot( True )
+        self._port_change_timer.setInterval( 150 )
+        self._port_change_timer.timeout.connect( self.change_port )
+        
+        # pick up added and removed ports
+        self._port_refresh_timer = QTimer( self )
+        self._port_refresh_timer.setInterval( 2000 )
+        self._port_refresh_timer.timeout.connect( self._refresh_ports_if_changed )
+        self._port_refresh_timer.start()
         
         
         #--- init UI ---
@@ -177,6 +497,9 @@ class SampleHolderInterface( QWidget ):
         
         self.lbl_status = QLabel( 'Disconnected' )
         self.btn_connect = QPushButton( 'Connect' )
+        self.btn_connect.setToolTip( 
+            'Connect to the sample holder. Low latency mode is enabled on the port if supported.' 
+        )
     
         lo_statusView = QVBoxLayout()
         lo_statusView.addWidget( self.lbl_statusLight )
@@ -219,31 +542,26 @@ class SampleHolderInterface( QWidget ):
         lbl_samples = QLabel( 'Occupied Samples:' )
         lbl_samples.setToolTip( 'Specify occupied sample positions.' )
         
-        lo_samples = QHBoxLayout()
+        # row 0 is check boxes, row 1 is labels
+        lo_samples = QGridLayout()
         lo_samples.setAlignment( Qt.AlignTop )
-        lo_samples.addWidget( lbl_samples )
+        lo_samples.addWidget( lbl_samples, 0, 0, 2, 1 )
         
         self.cbgr_occupied = QButtonGroup( exclusive = False )
+        self._occ_checkboxes = [] # ( sample, check box ), in sample order
         for s in range( self.samples ):
-            lbl_sample = QLabel( str( s ) )
             cb_sample = QCheckBox()
             self.cbgr_occupied.addButton( cb_sample, s )
+            self._occ_checkboxes.append( ( s, cb_sample ) )
             
-            lo_sample = QVBoxLayout()
-            lo_sample.addWidget( cb_sample )
-            lo_sample.addWidget( lbl_sample )
-            
-            lo_samples.addLayout( lo_sample )
+            lo_samples.addWidget( cb_sample, 0, s + 1 )
+            lo_samples.addWidget( QLabel( str( s ) ), 1, s + 1 )
         
         # toggle all 
         self.cb_occupy_all = QCheckBox()
-        lbl_all = QLabel( 'All' )
         
-        lo_all = QVBoxLayout()
-        lo_all.addWidget( self.cb_occupy_all )
-        lo_all.addWidget( lbl_all )
-        
-        lo_samples.addLayout( lo_all )
+        lo_samples.addWidget( self.cb_occupy_all, 0, self.samples + 1 )
+        lo_samples.addWidget( QLabel( 'All' ), 1, self.samples + 1 )
         
         parent.addLayout( lo_samples )
         
@@ -258,10 +576,7 @@ class SampleHolderInterface( QWidget ):
             else 'None'
         )
         self.lbl_current = QLabel( sample )
-        
-        bold = QtGui.QFont()
-        bold.setBold( True )
-        self.lbl_current.setFont( bold )
+        self.lbl_current.setFont( _bold_font() )
         
         lo_current = QHBoxLayout()
         lo_current.addWidget( lbl_current_title )
@@ -297,12 +612,17 @@ class SampleHolderInterface( QWidget ):
         lo_goto = QHBoxLayout()
         lo_goto.addWidget( lbl_goto )
         
+        # button text is the sample space, so tooltip can be shared
+        goto_tt = 'Move to this sample space.'
+        
         self.btngr_goto = QButtonGroup()
+        self._goto_buttons = []
         for s in range( self.samples ):
             btn_goto = QPushButton( str( s ) )
-            btn_goto.setToolTip( 'Move to sample space {}.'.format( s ) )
+            btn_goto.setToolTip( goto_tt )
             
             self.btngr_goto.addButton( btn_goto, s )
+            self._goto_buttons.append( btn_goto )
             lo_goto.addWidget( btn_goto )
             
         parent.addLayout( lo_goto )
@@ -325,15 +645,9 @@ class SampleHolderInterface( QWidget ):
         
         
     def ui_advanced_move( self, parent ):
-        move_tt = 'Move the motor position the given number of steps.'
-        if self.inst is not None:
-            move_tt += ' This motor has {} steps per revolution.'.format( self.inst.SPR )
-        
+        # tool tips set by update_advanced_ui
         self.btn_move = QPushButton( 'Move' )
-        self.btn_move.setToolTip( move_tt )
-        
         self.sb_move = QSpinBox()
-        self.sb_move.setToolTip( move_tt )
         
         lo_move = QHBoxLayout()
         lo_move.addWidget( self.sb_move )
@@ -345,7 +659,7 @@ class SampleHolderInterface( QWidget ):
     #--- ui functionality ---
     
     def register_connections( self ):
-        self.cmb_comPort.currentTextChanged.connect( self.change_port )
+        self.cmb_comPort.currentTextChanged.connect( lambda: self._port_change_timer.start() )
         self.btn_connect.clicked.connect( self.toggle_connect )  
         self.btn_enable.clicked.connect( self.toggle_enable )
 
@@ -357,48 +671,52 @@ class SampleHolderInterface( QWidget ):
             
         self.btn_offset.clicked.connect( self.offset )
         self.btn_move.clicked.connect( self.move )
+        
+        # worker
+        self.cmd.connect( self.worker.execute, Qt.QueuedConnection )
+        self.worker.connected.connect( self.worker_connected, Qt.QueuedConnection )
+        self.worker.enabled.connect( self.worker_enabled, Qt.QueuedConnection )
+        self.worker.sample_changed.connect( self.update_sample_ui, Qt.QueuedConnection )
+        self.worker.error.connect( self.worker_error, Qt.QueuedConnection )
+        self.worker.done.connect( self.worker_done, Qt.QueuedConnection )
 
         
-    def getComPorts( self ):
-        """ (from https://stackoverflow.com/a/14224477/2961550)
-        Lists serial port names
+    def getComPorts( self, force = False ):
+        """
+        Lists serial port names.
+        Ports are enumerated by the operating system rather than probed,
+            and the result is cached for 2 seconds.
 
-        :raises EnvironmentError:
-            On unsupported or unknown platforms
+        :param force: Enumerate ports even if cached. [Default: False]
         :returns:
             A list of the serial ports available on the system
         """
-        if sys.platform.startswith( 'win' ):
-            ports = [ 'COM%s' % (i + 1) for i in range( 256 ) ]
-            
-        elif sys.platform.startswith( 'linux' ) or sys.platform.startswith( 'cygwin' ):
-            # this excludes your current terminal "/dev/tty"
-            ports = glob.glob( '/dev/tty[A-Za-z]*' )
-            
-        elif sys.platform.startswith( 'darwin' ):
-            ports = glob.glob( '/dev/tty.*' )
-            
-        else:
-            raise EnvironmentError( 'Unsupported platform' )
-
-        result = []
-        for port in ports:
-            try:
-                s = serial.Serial( port )
-                s.close()
-                result.append( port )
-                
-            except ( OSError, serial.SerialException ):
-                pass
-            
-        return result    
+        now = time.monotonic()
+        if ( not force ) and ( self._ports_cache is not None ) and ( now - self._ports_cache[ 0 ] < 2 ):
+            return list( self._ports_cache[ 1 ] )
+        
+        ports = sorted( port.device for port in list_ports.comports() )
+        self._ports_cache = ( now, ports )
+        
+        return list( ports )
     
     #--- slot functions ---
         
     def change_port( self ):
         """
-        Changes port and disconnects from current port if required
+        Changes port and disconnects from current port if required.
+        Called once selection changes settle.
         """
+        if self.cmb_comPort.currentText() == self.port:
+            # selection returned to current port
+            return
+        
+        if self.pending_cmds:
+            # a connection may be in progress on the current port, 
+            # retry once the worker finishes
+            self._port_change_timer.start()
+            return
+        
         # disconnect and delete controller
         self.delete_controller()
           
@@ -414,77 +732,103 @@ class SampleHolderInterface( QWidget ):
         self.update_ports_ui()
         
         
+    def _refresh_ports_if_changed( self ):
+        """
+        Updates UI list only if available COMs changed.
+        Called periodically, so bypasses the cache to notice new ports on the next tick.
+        """
+        ports = self.getComPorts( force = True )
+        if ports != self.ports:
+            self.ports = ports
+            self.update_ports_ui()
+            
+            
     def toggle_connect( self ):
         """
         Toggles connection between selected com port
         """
+        if ( self.inst is None ) and self.pending_cmds:
+            # disconnecting is allowed while busy, to cancel motions
+            return
+        
         # show waiting for communication
         self.lbl_status.setText( 'Waiting...' )
         self.lbl_statusLight.setPixmap( self.img_yellowLight )
-        self.repaint()
         
         # create controller if doesn't already exist, connect
         if self.inst is None:
-            try:
-                self.inst = shc.SampleHolderController( self.port )
-                self.inst.connect()
-                
-            except Exception as err:
-                self.inst = None
-                self.update_connected_ui( False )
-                
-                warning = QMessageBox()
-                warning.setWindowTitle( 'Sample Holder Controller Error' )
-                warning.setText( 'Could not connect\n{}'.format( err ) )
-                warning.exec()
+            self.send_cmd( 'connect', self.port )
             
         else:
             self.delete_controller()
-        
-        # update ui
-        if self.inst is not None:
-            self.update_connected_ui( self.inst.connected )
-            self.update_commands_ui()
-            self.update_advanced_ui()
-            
-        else:
-            self.update_connected_ui( False )
 
             
     def toggle_enable( self ):
         if not self.is_connected():
             return
         
+        if self.pending_cmds:
+            return
+        
         # show waiting for communication
         self.lbl_enable.setText( 'Waiting...' )
         self.lbl_enableLight.setPixmap( self.img_yellowLight )
-        self.repaint()
         
-        if self.inst.is_enabled():
-            self.inst.disable()
+        self.send_cmd( 'toggle_enable' )
+        
+    
+    def worker_connected( self, connected ):
+        self.inst = self.worker.inst if connected else None
+        if self.inst is not None:
+            # steps per revolution is fixed once connected
+            self._step_max = math.ceil( self.inst.SPR/ 2 )
+            self.sb_offset.setRange( -self._step_max, self._step_max )
+            self.sb_move.setRange( -self._step_max, self._step_max )
             
         else:
-            self.inst.enable()
-            self.inst.home()
-            self.update_commands_ui()
+            self._enabled_cache = None
             
-        self.update_enabled_ui( self.inst.is_enabled() )
+        self.update_connected_ui( connected )
+        self.update_commands_ui()
+        self.update_advanced_ui()
+        
+        
+    def worker_enabled( self, enabled ):
+        self._enabled_cache = enabled
+        self.update_enabled_ui( enabled )
+        
+        
+    def worker_error( self, msg ):
+        warning = QMessageBox()
+        warning.setWindowTitle( 'Sample Holder Controller Error' )
+        warning.setText( msg )
+        warning.exec()
+        
+        
+    def worker_done( self ):
+        self.pending_cmds -= 1
+        if not self.pending_cmds:
+            self.set_commands_enabled( True )
         
     
     def update_occupied( self ):
-        self.occupied = [] # clear for repopulation
-        for cb_occ in self.cbgr_occupied.buttons():
-            if cb_occ.isChecked():
-                sample = self.cbgr_occupied.id( cb_occ )
-                self.occupied.append( sample )
+        # check boxes are in sample order, so occupied is sorted
+        self.occupied = [ sample for sample, cb_occ in self._occ_checkboxes if cb_occ.isChecked() ]
+        self._occupied_sorted = list( self.occupied )
                 
                 
     def toggle_occupied( self ):
         state = self.cb_occupy_all.checkState()
-        for cb_occ in self.cbgr_occupied.buttons():
+        for _, cb_occ in self._occ_checkboxes:
             cb_occ.setCheckState( state )
-            
-        self.update_occupied()
+        
+        # all or none are occupied
+        self.occupied = (
+            [ sample for sample, _ in self._occ_checkboxes ]
+            if ( state == Qt.Checked ) 
+            else []
+        )
+        self._occupied_sorted = list( self.occupied )
         
         
     def step( self, step = 1 ):
@@ -494,7 +838,8 @@ class SampleHolderInterface( QWidget ):
         if not self.is_enabled():
             return
         
-        if len( self.occupied ) == 0:
+        occupied = self._occupied_sorted
+        if len( occupied ) == 0:
             # no samples occupied
             warning = QMessageBox()
             warning.setWindowTitle( 'Sample Holder Controller Error' )
@@ -506,27 +851,20 @@ class SampleHolderInterface( QWidget ):
             # id 0 is previous, 1 is next
             step = -1 if ( self.btngr_move.id( step ) == 0 ) else 1
     
-        try:
-            curr = self.occupied.index( self.inst.sample )
-            
-        except ValueError:
+        sample = self.inst.sample
+        curr = bisect.bisect_left( occupied, sample )
+        if ( curr == len( occupied ) ) or ( occupied[ curr ] != sample ):
             # current position unoccupied
-            # find nearest occupied sample
-            
-            # create new list with current position inserted
-            occ = self.occupied.copy()
-            occ.append( self.inst.sample )
-            occ.sort()
+            # curr is where it would be inserted, between its neighbors
             
             # move to next sample in direction of step
             # decrement number of steps to account for moving onto position
             sign = 1 if ( step > 0 ) else -1 if ( step < 0 ) else 0
-            curr = ( occ.index( self.inst.sample ) + sign )% len( occ )
-            curr = self.occupied.index( occ[ curr ] )
+            curr = ( curr if ( sign >= 0 ) else curr - 1 )% len( occupied )
             step += -sign* 1
             
-        new = ( curr + step )% len( self.occupied )
-        new = self.occupied[ new ]
+        new = ( curr + step )% len( occupied )
+        new = occupied[ new ]
         
         self.goto( new )
         
@@ -544,8 +882,7 @@ class SampleHolderInterface( QWidget ):
         if not self.is_enabled():
             return
         
-        self.inst.goto( pos )
-        self.update_commands_ui()
+        self.send_motion( 'goto', pos )
 
     
     def offset( self ):
@@ -556,8 +893,7 @@ class SampleHolderInterface( QWidget ):
             return
         
         num = self.sb_offset.value()
-        self.inst.offset( num )
-        self.update_commands_ui()
+        self.send_motion( 'offset', num )
         
         
     def move( self ):
@@ -568,29 +904,46 @@ class SampleHolderInterface( QWidget ):
             return
         
         num = self.sb_move.value()
-        self.inst.move( num )
-        self.update_commands_ui()
+        self.send_motion( 'move', num )
         
         
     #--- helper functions ---
     
+    def send_cmd( self, *cmd ):
+        """
+        Sends a command to the worker, 
+            disabling motion commands until it finishes.
+        """
+        self.pending_cmds += 1
+        self.set_commands_enabled( False )
+        self.cmd.emit( cmd )
+        
+        
+    def send_motion( self, *cmd ):
+        """
+        Queues a motion for the worker, 
+            disabling motion commands until it finishes.
+        """
+        self.pending_cmds += 1
+        self.set_commands_enabled( False )
+        self._cmd_queue.put( cmd )
+        
+        
     def delete_controller( self ):
         if self.inst is not None:
-            self.inst.disable()
-            self.inst.disconnect()
-            del self.inst
             self.inst = None
+            self._enabled_cache = None
+            self.send_cmd( 'disconnect' )
             
             
     def parse_com_port( self, name ):
-        pattern = "(\w+)\s*(\(\s*\w*\s*\))?"
-        matches = re.match( pattern, name )
+        if name == _NO_PORTS_SENTINEL:
+            return None
+        
+        matches = _COM_PORT_RE.match( name )
         if matches:
-            name = matches.group( 1 )
-            if name == 'No COM ports available...':
-                return None
-            else:
-                return name
+            return matches.group( 1 )
+        
         else:
             return None
         
@@ -600,13 +953,30 @@ class SampleHolderInterface( QWidget ):
         
         
     def update_ports_ui( self ):
-        self.cmb_comPort.clear()
+        # repopulate without signaling intermediate selections
+        prev_port = self.cmb_comPort.currentText()
+        self.cmb_comPort.blockSignals( True )
+        try:
+            self.cmb_comPort.clear()
+
+            if len( self.ports ):
+                self.cmb_comPort.addItems( self.ports )
+
+            else:
+                self.cmb_comPort.addItem( _NO_PORTS_SENTINEL )
+
+            # preserve selection
+            idx = self.cmb_comPort.findText( prev_port )
+            if idx > -1:
+                self.cmb_comPort.setCurrentIndex( idx )
+
+        finally:
+            self.cmb_comPort.blockSignals( False )
         
-        if len( self.ports ):
-            self.cmb_comPort.addItems( self.ports )
-            
-        else:
-            self.cmb_comPort.addItem( 'No COM ports available...' )
+        # apply only a real change of selection
+        # starts the timer directly, as the first call is before signals are connected
+        if self.cmb_comPort.currentText() != prev_port:
+            self._port_change_timer.start()
             
             
     def update_connected_ui( self, connected ):
@@ -651,6 +1021,19 @@ class SampleHolderInterface( QWidget ):
         self.btn_enable.setText( btnText )
         
         
+    def update_sample_ui( self, sample ):
+        self.lbl_current.setText( str( sample ) )
+        
+        
+    def set_commands_enabled( self, enabled ):
+        for btn in (
+            self.btngr_move.buttons() 
+            + self._goto_buttons 
+            + [ self.btn_move, self.btn_offset ]
+        ):
+            btn.setEnabled( enabled )
+            
+        
     def update_commands_ui( self ):
         sample = (
             None if ( self.inst is None ) 
@@ -660,14 +1043,12 @@ class SampleHolderInterface( QWidget ):
         
         
     def update_advanced_ui( self ):
-        if self.inst: 
-            step_max = math.ceil( self.inst.SPR/ 2 )
-            
-            self.sb_offset.setMinimum( -step_max ) 
-            self.sb_offset.setMaximum( step_max )
+        move_tt = 'Move the motor position the given number of steps.'
+        if self.inst is not None:
+            move_tt += ' This motor has {} steps per revolution.'.format( self.inst.SPR )
             
-            self.sb_move.setMinimum( -step_max ) 
-            self.sb_move.setMaximum( step_max )
+        self.btn_move.setToolTip( move_tt )
+        self.sb_move.setToolTip( move_tt )
             
     
     def is_connected( self ):   
@@ -688,7 +1069,7 @@ class SampleHolderInterface( QWidget ):
         if not self.is_connected():
             return None
         
-        if not self.inst.is_enabled():
+        if not self._enabled_cache:
             warning = QMessageBox()
             warning.setWindowTitle( 'Sample Holder Controller Error' )
             warning.setText( 'Not enabled.' )
@@ -704,20 +1085,25 @@ class SampleHolderInterface( QWidget ):
 
 
 # FREEZE
-app = QCoreApplication.instance()
-if app is None:
-    app = QApplication( sys.argv )
+def main():
+    app = QCoreApplication.instance()
+    if app is None:
+        app = QApplication( sys.argv )
+
+    main_window = SampleHolderInterface( samples = 10 )
+    sys.exit( app.exec_() )
+    
     
-main_window = SampleHolderInterface( samples = 10)
-sys.exit( app.exec_() )
+if __name__ == '__main__':
+    main()
 
 
 # In[ ]:
 
 
 # FREEZE
-get_ipython().run_line_magic('load_ext', 'autoreload')
-get_ipython().run_line_magic('autoreload', '1')
+# get_ipython().run_line_magic('load_ext', 'autoreload')
+# get_ipython().run_line_magic('autoreload', '1')
 
 
 # In[ ]: